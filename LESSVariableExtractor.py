@@ -27,8 +27,357 @@ import sublime
 # The `sublime_plugin` library is included to get access to hooks and functions necessary for plugin development.
 import sublime_plugin
 
-# The `re` library is included to give us access to regular expressions.
-import re
+# The `itertools` library is included to give us tools for working with lists and other iterables.
+import itertools
+
+# The main complication with splitting shorthand values is the `!important` keyword.
+# This applies to the entirety of the value and not just the last one.
+# Here we store the string `!important` simply to be DRY.
+_IMPORTANT = '!important'
+
+# Here we store the characters that count as whitespace around a property or a value.
+# Lines never contain a new line character `\n`, since we split the text on it.
+# Note that `_scan` only trims these ASCII characters, while splitting shorthand values (see `_process_block`)
+# uses `split()`, which also splits on non-ASCII whitespace such as a non-breaking space.
+_WHITESPACE = ' \t\r\f\v'
+
+# Sublime Text hands us `unicode` strings under Python 2 (Sublime Text 2) and `str` strings under Python 3 (Sublime Text 3).
+# `type(u'')` is whichever of those the running version of Python uses for text.
+_TEXT = type(u'')
+
+# `string.isprintable()` is False for every whitespace character other than the plain space,
+# so a value with no space in it that is printable has nothing in it that `split()` would split on.
+# Python 2 has no `isprintable()`, so there we fall back to the stricter `isalnum()` (letters and numbers only).
+# A value that either of them turns away just goes through the shorthand handling, which gives the same result.
+_is_printable = getattr(_TEXT, 'isprintable', _TEXT.isalnum)
+
+# Here, we define a function at the module level (outside of any class) to find the parts of a single line.
+# A style declaration is simple enough (`property: value; comment`) that we don't need a regex to take it apart.
+# Instead, we walk through the line once from left to right:
+#     leading whitespace --> property --> whitespace --> `:` --> whitespace --> value --> whitespace --> `;` --> comment
+# Rather than creating a new string for each part, it returns a tuple of the positions where each part begins and ends,
+# or `None` (Python's version of `null`) if the line is not a style declaration.
+# By convention, names beginning with an underscore `_` are meant to be private to this module.
+# `find` and `whitespace` are "default parameters" (as in JavaScript, `function (a, b = 1)`) that are never passed in.
+# Default values are worked out only once, when the function is defined, and are then read as fast as any
+# other parameter, so Python doesn't have to look up `_TEXT.find` or `_WHITESPACE` again for every line.
+def _scan(line, find=_TEXT.find, whitespace=_WHITESPACE):
+    # `string.find()` is Python's version of `string.indexOf()` in JavaScript and returns `-1` when nothing is found.
+    # Here, we call it as `find(line, ':')`, which is the same as `line.find(':')`.
+    # (`string.index()` does the same, but raises an error instead, which is slower to recover from.)
+    colon = find(line, ':')
+
+    if colon == -1:
+        return None
+
+    # The value ends at the first `;` after the colon.
+    # Anything after it (for example: `// comment`) is kept as-is.
+    # Note that `find()` can be told where to start looking.
+    semicolon = find(line, ';', colon)
+
+    if semicolon == -1:
+        return None
+
+    # Here, we skip forward over the whitespace before the property.
+    # Note that Python does not have the `++` operator, so we use `+= 1` instead.
+    prop_start = 0
+    while prop_start < colon and line[prop_start] in whitespace:
+        prop_start += 1
+
+    # Here, we skip backward from the colon over the whitespace after the property.
+    prop_end = colon
+    while prop_end > prop_start and line[prop_end - 1] in whitespace:
+        prop_end -= 1
+
+    # We do the same on both sides of the value.
+    value_start = colon + 1
+    while value_start < semicolon and line[value_start] in whitespace:
+        value_start += 1
+
+    value_end = semicolon
+    while value_end > value_start and line[value_end - 1] in whitespace:
+        value_end -= 1
+
+    # Both the property and the value must have something in them.
+    if prop_start == prop_end or value_start == value_end:
+        return None
+
+    # We exclude the `@` character from the property so that we don't act on variable declarations
+    # (for example: `@width: 10px;`),
+    # and from the value so that we don't act on already-existing variables.
+    # Note that `find()` can also be told where to stop looking.
+    if find(line, '@', prop_start, prop_end) != -1 or find(line, '@', value_start, value_end) != -1:
+        return None
+
+    # In Python, a comma-separated list of values in parentheses is a "tuple", a list that cannot be changed.
+    return (prop_start, prop_end, colon, value_start, value_end, semicolon)
+
+# Here, we define the function that does the actual work of extracting the variables out of a block of lines.
+# It only works with plain strings and never touches Sublime Text itself,
+# which keeps the text manipulation separate from the plugin commands below.
+# It returns a tuple of where the changed text begins and ends (counted from the start of `text`),
+# the new text to put there, and the variables to prepend,
+# or `None` if there are no style declarations in the text.
+def _process_block(text, prefix):
+    # `string.split()` gives us a list of the individual lines, just like `string.split('\n')` in JavaScript.
+    lines = text.split('\n')
+
+    # Here we set up a counter so that we can generate unique variable names.
+    counter = 0
+
+    # Here, we create a list to hold the final output with the list of the newly-created variables.
+    # In Python, Lists serve the function that we would expect from Arrays in JavaScript and Ruby with very similar syntax.
+    # Each line adds at most one entry, so we create the list at its full size up front (filled with `None`)
+    # instead of letting it grow one entry at a time.
+    # `variable_count` keeps track of how many entries we have filled in so far.
+    variables      = [None] * len(lines)
+    variable_count = 0
+
+    # Here, we create a dictionary to remember which variable we created for each CSS value.
+    # In Python, Dictionaries serve the function that we would expect from Objects in JavaScript and Hashes in Ruby.
+    # When the same value (for example: `#fff` or `0`) shows up again, we reuse its variable instead of creating a new one.
+    seen = {}
+
+    # Here, we keep track of the first and last lines that we change, so that only those lines
+    # (and the lines in between them) have to be replaced.
+    # We start them as `None` since we haven't changed any lines yet.
+    first = None
+    last  = None
+
+    # Each call to `view.replace()` has to reach into Sublime Text itself, so rather than replacing
+    # one line at a time, we write each changed line back into `lines` and replace all of them in one go at the end.
+    # `growth` keeps track of how many characters longer the changed lines have become,
+    # so that we can still work out where the original lines ended.
+    growth = 0
+
+    # In Python, functions are objects that can be stored in variables.
+    # Storing the ones we call for every line here means Python doesn't have to look them up again each time.
+    scan         = _scan
+    is_printable = _is_printable
+
+    # Here, we iterate over the lines from top to bottom.
+    # Since nothing is replaced until all the lines have been processed, we don't need to worry about
+    # earlier replacements shifting the positions of later lines.
+    # `enumerate()` gives us the position (index) of each line along with the line itself,
+    # similar to `array.forEach(function (line_text, index) { ... })` in JavaScript.
+    for index, line_text in enumerate(lines):
+        # A line without both a `:` and a `;` (blank lines, `{`, `}`, comments) can't be a style declaration,
+        # so we skip it with a quick check before doing any real work.
+        # Lines that are skipped are kept exactly as they were.
+        if ':' not in line_text or ';' not in line_text:
+            # `continue` skips ahead to the next line, just like in JavaScript.
+            continue
+
+        # Here, we find where each part of the line begins and ends.
+        bounds = scan(line_text)
+
+        if bounds:
+            # In Python, a tuple can be "unpacked" into several variables at once,
+            # similar to destructuring assignment in JavaScript (`[a, b] = bounds`).
+            prop_start, prop_end, colon, value_start, value_end, semicolon = bounds
+
+            # Here, we use Python's "slice" syntax (`s[a:b]`, equivalent to `s.slice(a, b)` in JavaScript)
+            # to get each part of the line.
+            # Leaving out a number means "from the beginning" or "to the end".
+            # We store these in variables here to assign meaningful names.
+            # We capture the whitespace so that when we reconstruct the style declaration with the variable,
+            # it will match the original whitespace.
+            space_before_property = line_text[:prop_start]
+            css_property          = line_text[prop_start:prop_end]
+            space_after_property  = line_text[prop_end:colon]
+            space_before_value    = line_text[colon + 1:value_start]
+            css_value             = line_text[value_start:value_end]
+            space_after_value     = line_text[value_end:semicolon]
+            inline_comments       = line_text[semicolon + 1:]
+
+            # Here, we increment the counter so that we can generate the variable names.
+            # The Math addition operator is `+` as it is in most languages.
+            counter = counter + 1
+
+            # Here, we generate the name of the variable with a unique number and the CSS property.
+            # For example: `@prefix-lessvar2-color`.
+            # We add 'lessvar' to the counter so that if the user uses multiple selections to edit
+            # the names of the variables, it will be distinct enough to not be confused with actual
+            # numerical values within the text.
+            # In Python, you cannot concatenate strings and integers with the `+` operator,
+            # since Python will not coerce the integers as JavaScript will.
+            # Instead, we use the `%` operator to format a string (similar to `sprintf` in C or Ruby).
+            # Each `%s` is replaced by the string and each `%d` by the integer in the tuple that follows,
+            # building the whole name in one step without any intermediate strings.
+            # (f-strings are not available in the Python versions bundled with Sublime Text 2 and 3.)
+            prefixed_name = '%s-lessvar%d-%s' % (prefix, counter, css_property)
+
+            # Most CSS values are a single simple value (for example: `color: red;` or `margin-top: 10px;`).
+            # Here, we check for that common case first, so that it can skip all of the shorthand handling below.
+            # If there is no space in the value and it is printable (see `_is_printable` above),
+            # then there is no whitespace anywhere in it, so it is a single value.
+            if ' ' not in css_value and is_printable(css_value):
+                # If we have already created a variable for this value, we simply reuse its name.
+                # Note that `in` checks whether a key is in a dictionary, like `key in object` in JavaScript.
+                if css_value in seen:
+                    new_value = seen[css_value]
+                # Otherwise, we remember the new variable and add it to the global list of output variables.
+                else:
+                    seen[css_value] = prefixed_name
+                    variables[variable_count] = ''.join((prefixed_name, ': ', css_value, ';'))
+                    variable_count += 1
+                    new_value = prefixed_name
+            # If there may be whitespace in the CSS value (meaning that it is a shorthand and/or contains the `!important` keyword),
+            else:
+                # Here, we split the value on the whitespace so that we can generate an individual variable for each value.
+                # This will result in a list of each individual shorthand value: '1px solid black' --> ['1px', 'solid', 'black'].
+                # Generally, CSS properties with spaced values tend to be shorthands.
+                # For example: `border-width`, `border-style`, `border-color`).
+                # Therefore, within this code, we call it "shorthand".
+                # Unlike `string.split(" ")`, calling `split()` with nothing passed in treats any run of whitespace
+                # (`1px  solid\tblack`) as a single separator.
+                shorthand = css_value.split()
+
+                # `important` is a boolean that is set to true when the last value is `!important`.
+                # Note that Python here acts like Ruby in that you can access elements from the end
+                # of a(n) list/array by using negative indices.
+                # Also note that value equivalence is tested with two equal signs `==` as in JavaScript.
+                # For a strict identity equivalence test, we would use `is` in Python.
+                # Side note: in Python, booleans are capitalized as `True` and `False` unlike JavaScript and Ruby.
+                # Note: Unlike in JavaScript, where `length` is a property of an array (`array.length`),
+                # in Python, you must pass the list into the function `len()` to get its length.
+                # We check that there is more than one value so that a lone `!important` is still extracted.
+                important = len(shorthand) > 1 and shorthand[-1] == _IMPORTANT
+
+                # If the `important` flag is set to true, then we want to handle it separately and not in
+                # the normal flow of how we handle other shorthand values.
+                # We don't want to create a separate variable for `!important`.
+                # Instead, we want to leave `!important` as part of the style declaration and only pull out actual values.
+                # Slicing off the last element (namely the `!important`) with `[:-1]` leaves it out so that it won't be acted upon.
+                # Note that here, we are using a one-line if statement.
+                if important: shorthand = shorthand[:-1]
+
+                # `split()` also splits on non-ASCII whitespace (such as a non-breaking space), which `_scan` does not trim,
+                # so a value made up only of such characters splits into nothing at all.
+                # In that case there is nothing to pull out into a variable, so we keep the line exactly as it was.
+                if not shorthand:
+                    continue
+
+                # Generally, we are doing on a smaller scale to the individual shorthand variables what we
+                # are doing on a larger scale to simple values — pulling them out into their own variables.
+                # Therefore, we see similar storage variables here as we see above with
+                # `counter`, `prefixed_name` and `variables`.
+                # `shorthand_counter` will keep track of which individual value we are looking at and we will
+                # it to generate the variable name.
+                # For example: `border: 1px solid black` will create the variables:
+                #     @prefix-lessvar3-border-lessv3sv1: 1px;
+                #     @prefix-lessvar3-border-lessv3sv2: solid;
+                #     @prefix-lessvar3-border-lessv3sv3: black;
+                shorthand_counter = 0
+
+                # `shorthand_replacement` will hold the variable names that will replace the shorthand values.
+                # For example: `['@prefix-lessvar3-border-lessv3sv1', '@prefix-lessvar3-border-lessv3sv2', '@prefix-lessvar3-border-lessv3sv3']`.
+                # We collect the pieces in a list and join them once at the end.
+                # Strings in Python cannot be changed, so every `+` would create a brand new string.
+                shorthand_replacement = []
+
+                # `shorthand_variables` will hold the small-scale version of `variables` above to hold the variables that will
+                # be outputted at the end.
+                # For example:
+                #     @prefix-lessvar3-border-lessv3sv1: 1px;
+                #     @prefix-lessvar3-border-lessv3sv2: solid;
+                #     @prefix-lessvar3-border-lessv3sv3: black;
+                shorthand_variables = []
+
+                # Here, we iterate over the values contained within the shorthand value.
+                for value in shorthand:
+                    # We increment the counter to generate the variable name.
+                    shorthand_counter = shorthand_counter + 1
+
+                    # If we have already created a variable for this value, we simply reuse its name.
+                    if value in seen:
+                        shorthand_replacement.append(seen[value])
+                        continue
+
+                    # Here we deal with a nuance introduced by handling `!important`.
+                    # If there is only one value (ex. `color: black !important;`),
+                    # we don't want add the counter since it would only ever be `1`.
+                    # Here, we check for this condition.
+                    if len(shorthand) == 1:
+                        # and if it is met, we use `prefixed_name` as-is.
+                        # Ex: `@prefix-lessvar4-color`.
+                        prop_name = prefixed_name
+                    # However, if this condition is not present (meaning that there is more than one value)
+                    else:
+                        # append the `shorthand_counter` to the prefixed name.
+                        # We add 'lessv{counter}sv' to the shorthand counter so that if the user uses multiple selections
+                        # to edit the names of the variables, it will be distinct enough to not be confused with actual
+                        # numerical values within the text.
+                        # Ex: `@prefix-lessvar3-border-lessv3sv1`.
+                        prop_name = '%s-lessv%dsv%d' % (prefixed_name, counter, shorthand_counter)
+
+                    # We remember the name of the new variable in case the same value shows up again.
+                    seen[value] = prop_name
+
+                    # We update `shorthand_variables` to include the new variable.
+                    # `''.join()` glues the pieces together without creating a new string for each `+`.
+                    shorthand_variables.append(''.join((prop_name, ': ', value, ';')))
+
+                    # We also update `shorthand_replacement` to include the new variable name that will replace the shorthand values.
+                    shorthand_replacement.append(prop_name)
+
+                # Now that we have finished generating variables for each of the individual shorthand values,
+                # we can add them to the global list of output variables.
+                # Here we join the individual shorthand variables with a new line character `\n` between them,
+                # just like `array.join('\n')` in JavaScript.
+                # If every value was reused, there is nothing new to add.
+                if shorthand_variables:
+                    variables[variable_count] = '\n'.join(shorthand_variables)
+                    variable_count += 1
+
+                # Here, we join `shorthand_replacement` with a space between each of the individual shorthand variables.
+                # One thing to note here: `(' ' + _IMPORTANT if important else '')` is Python's version of a ternary expression.
+                # This is equivalent to: `(important ? ' ' + _IMPORTANT : '')` in JavaScript:
+                #     If the `!important` keyword is present (`important` is set to True), then add it back to the style declaration.
+                #     Otherwise, add nothing.
+                new_value = ' '.join(shorthand_replacement) + (' ' + _IMPORTANT if important else '')
+
+            # Here, we reconstruct the style declaration, except that we replace the original value with the variables.
+            # Note that we do honor the original whitespace by capturing it above.
+            # For example:
+            #     `    border : 1px solid black ; // comment ` -->
+            #     `    border : @prefix-lessvar3-border-lessv3sv1 @prefix-lessvar3-border-lessv3sv2 @prefix-lessvar3-border-lessv3sv3 ; // comment `
+            replacement = ''.join((space_before_property, css_property, space_after_property, ':', space_before_value, new_value, space_after_value, ';', inline_comments))
+
+            # Now we have what we need to replace the original CSS values with the variables.
+            # Here, we write the new line back into `lines` in place of the original one.
+            growth = growth + len(replacement) - len(line_text)
+            lines[index] = replacement
+
+            # We remember that this line has changed.
+            # `is` checks whether something is exactly `None`, like `=== null` in JavaScript.
+            if first is None:
+                first = index
+            last = index
+
+    # If no lines were changed, then there is nothing to replace.
+    if first is None:
+        return None
+
+    # Here, we remove the entries we did not need with `del`, without copying the rest of the list.
+    del variables[variable_count:]
+
+    # Here, we work out where the changed lines begin and end within `text`.
+    # Every line before the first changed line takes up its length plus one for its new line character `\n`.
+    # `map(len, ...)` gets the length of each of those lines and `sum()` adds them up.
+    begin = sum(map(len, lines[:first])) + first
+    # The changed lines in `lines` have grown by `growth` characters, so we take that back off to get the original end.
+    end   = begin + sum(map(len, lines[first:last + 1])) + (last - first) - growth
+
+    # Here, we join the changed lines (and the lines in between them) back together
+    # with a new line character `\n` between them.
+    # We also join all the variables with a new line character `\n` between them
+    # and two new lines at the end to separate the variables from the original text.
+    # `itertools.chain()` lets `join()` go through the variables followed by two empty strings,
+    # and each of those adds one more `\n`, so the whole output is built in one step.
+    # Note that in JavaScript, this would be:
+    #     `variables_output = variables.concat(['', '']).join('\n');`
+    return (begin, end, "\n".join(lines[first:last + 1]), "\n".join(itertools.chain(variables, ('', ''))))
 
 # In Sublime Text 2, the CamelCase name of the class MUST correlate to the snake_case version of the command.
 # It MUST ALSO end with the 'Command'.
@@ -72,8 +421,7 @@ class ExtractCssValuesToLessVariablesCommand(sublime_plugin.TextCommand):
                 # run the `extract_variables` function (making sure to provide Sublime's `edit` and our `region` and `prefix).
                 self.extract_variables(edit, region, prefix)
 
-    # The extract_variables will iterate over the region, generate the variables, and replace the values.
-    # This could refactored to separate concerns better.
+    # The extract_variables will read the region, have `_process_block` generate the variables, and replace the values.
     # Note that `self` is included standard to Python object-oriented programming and we still pass through `edit`.
     def extract_variables(self, edit, region, prefix):
         # `view.line()` takes a region and expands it to include full lines.
@@ -81,187 +429,21 @@ class ExtractCssValuesToLessVariablesCommand(sublime_plugin.TextCommand):
         # Regions are simply ranges of characters and are NOT the actual strings.
         full_lines = self.view.line(region)
 
-        # `view.split_by_newlines` again takes a region and generates subregions based on new lines in the text.
-        # Note that this doesn't actually return STRINGS, but however an iteratable object of REGIONS.
-        lines = self.view.split_by_newlines(full_lines)
-
-        # Here we set up a counter so that we can generate unique variable names.
-        counter = 0
-
-        # Here, we create a list to hold the final output with the list of the newly-created variables.
-        # In Python, Lists serve the function that we would expect from Arrays in JavaScript and Ruby with very similar syntax.
-        variables = []
-
-        # Here, we iterate over the line regions in reverse order so as to not mess up the positions stored by `view.sel()`
-        for line in reversed(lines):
-            # Here, we run a regex search on each line.
-            # Note that we don't get the actual string until we pass in the region into `view.substr()`.
-            # We exclude the `@` character from the value so that we don't act on already-existing
-            # variables.
-            match = re.search(r"^(\s*)(.+)(\s*):(\s*)([^@]+)(\s*);(.*)$", self.view.substr(line))
-
-            if match:
-                # In Python, instead of using `\1` or `$1` to refer to the first regex captured group,
-                # we use `match.group(1)`.
-                # `match.group(0)` is the full string match itself.
-                # We store these in variables here to assign meaningful names.
-                # We capture the whitespace so that when we reconstruct the style declaration with the variable,
-                # it will match the original whitespace.
-                space_before_property = match.group(1)
-                css_property          = match.group(2)
-                space_after_property  = match.group(3)
-                space_before_value    = match.group(4)
-                css_value             = match.group(5)
-                space_after_value     = match.group(6)
-                inline_comments       = match.group(7)
-
-                # Here, we increment the counter so that we can generate the variable names.
-                # The Math addition operator is `+` as it is in most languages.
-                counter = counter + 1
-
-                # Here, we generate the name of the variable with a unique number and the CSS property.
-                # For example: `@prefix-lessvar2-color`.
-                # We add 'lessvar' to the counter so that if the user uses multiple selections to edit
-                # the names of the variables, it will be distinct enough to not be confused with actual
-                # numerical values within the text.
-                # String concatenation is done with the `+` operator as with JavaScript and Ruby.
-                # In Python, you cannot concatenate strings and integers.
-                # Python will not coerce the integers as JavaScript will, and therefore we will need to
-                # use the utility function `str()` to do so explicitly.
-                prefixed_name = prefix + '-' + 'lessvar' + str(counter) + '-' + css_property
-
-                # `replacement` will hold the text that will replace the CSS values.
-                # For example: border-bottom: {replacement}.
-                replacement   = ""
-
-                # Here we check to see if there is a space character in the CSS value so we can handle shorthand values.
-                if " " in css_value:
-                    # Here, we split the value on the space so that we can generate an individual variable for each value.
-                    # This will result in a list of each individual shorthand value: '1px solid black' --> ['1px', 'solid', 'black'].
-                    # Generally, CSS properties with spaced values tend to be shorthands.
-                    # For example: `border-width`, `border-style`, `border-color`).
-                    # Therefore, within this code, we call it "shorthand".
-                    shorthand = css_value.split(" ")
-
-                    # The main complication with splitting on space is the `!important` keyword.
-                    # This applies to the entirety of the value and not just the last one.
-                    # Here we store the string `!important` simply to be DRY.
-                    important_text = '!important'
-
-                    # `important` is a boolean that is set to true when the last value is `!important`.
-                    # Note that Python here acts like Ruby in that you can access elements from the end
-                    # of a(n) list/array by using negative indices.
-                    # Also note that value equivalence is tested with two equal signs `==` as in JavaScript.
-                    # For a strict identity equivalence test, we would use `is` in Python.
-                    # Side note: in Python, booleans are capitalized as `True` and `False` unlike JavaScript and Ruby.
-                    important = shorthand[-1] == important_text;
-
-                    # If the `important` flag is set to true, then we want to handle it separately and not in
-                    # the normal flow of how we handle other shorthand values.
-                    # We don't want to create a separate variable for `!important`.
-                    # Instead, we want to leave `!important` as part of the style declaration and only pull out actual values.
-                    # "Popping" the last element (namely the `!important`) will remove from the list so that it won't be acted upon.
-                    # Note that here, we are using a one-line if statement.
-                    if important: shorthand.pop()
-
-                    # Generally, we are doing on a smaller scale to the individual shorthand variables what we
-                    # are doing on a larger scale to simple values — pulling them out into their own variables.
-                    # Therefore, we see similar storage variables here as we see above with
-                    # `counter`, `prefixed_name` and `replacement`.
-                    # `shorthand_counter` will keep track of which individual value we are looking at and we will
-                    # it to generate the variable name.
-                    # For example: `border: 1px solid black` will create the variables:
-                    #     @prefix-lessvar3-border-lessv3sv1: 1px;
-                    #     @prefix-lessvar3-border-lessv3sv2: solid;
-                    #     @prefix-lessvar3-border-lessv3sv3: black;
-                    shorthand_counter = 0
-
-                    # `shorthand_replacement` will act as a small-scale version of `replacement` above to hold the text that will
-                    # replace the shorthand values.
-                    # For example: `@prefix-lessvar3-border-lessv3sv1 @prefix-lessvar3-border-lessv3sv2 @prefix-lessvar3-border-lessv3sv3`.
-                    shorthand_replacement = ""
-
-                    # `shorthand_variables` will hold the small-scale version of `variables` below to hold the variables that will
-                    # be outputted at the end.
-                    # For example:
-                    #     @prefix-lessvar3-border-lessv3sv1: 1px;
-                    #     @prefix-lessvar3-border-lessv3sv2: solid;
-                    #     @prefix-lessvar3-border-lessv3sv3: black;
-                    shorthand_variables = ""
-
-                    # Here, we iterate over the values contained within the shorthand value.
-                    for value in shorthand:
-                        # We increment the counter to generate the variable name.
-                        shorthand_counter = shorthand_counter + 1
-
-                        # Here we deal with a nuance introduced by handling `!important`.
-                        # If `!important` is present (if the `important` flag is set to true), but there is only one value
-                        # (ex. `color: black !important;`), we don't want add the counter since it would only ever be `1`.
-                        # Here, we check for this condition.
-                        # Note: Unlike in JavaScript, where `length` is a property of an array (`array.length`),
-                        # in Python, you must pass the list into the function `len()` to get its length.
-                        if important and len(shorthand) == 1:
-                            # and if it is met, we set `prop_name` to be the same as it would be for a non-shorthand declaration.
-                            # Ex: `@prefix-lessvar4-color`.
-                            prop_name = prefixed_name
-                        # However, if this condition is not present (meaning that `!important` is present and there is more than one value)
-                        else:
-                            # append the `shorthand_counter` to the prefixed name.
-                            # We add 'lessv{counter}sv' to the shorthand counter so that if the user uses multiple selections
-                            # to edit the names of the variables, it will be distinct enough to not be confused with actual
-                            # numerical values within the text.
-                            # Ex: `@prefix-lessvar3-border-lessv3sv1`.
-                            prop_name = prefixed_name + '-' + 'lessv' + str(counter) + 'sv' + str(shorthand_counter)
-
-                        # We update `shorthand_variables` to include the new variable and we include a new line for the output.
-                        shorthand_variables = shorthand_variables + prop_name + ': ' + value + ';\n'
-
-                        # We also update `shorthand_replacement` to include the new variable name that will replace the shorthand values.
-                        shorthand_replacement = shorthand_replacement + ' ' + prop_name
-
-                    # Now that we have finished generating variables for each of the individual shorthand values,
-                    # we can add them to the global list of output variables.
-                    # Note that `list.append()` is Python's version of `array.push()` in JavaScript.
-                    # Here we make use of `string.strip()` (Python's version of `string.trim()` in JavaScript).
-                    # This is mainly to remove the trailing new line character `\n` that would be added above
-                    # to the last individual shorthand value.
-                    variables.append(shorthand_variables.strip())
-
-                    # Here, we reconstruct the style declaration, except that we replace the original value with the shorthand variables.
-                    # Note that we do honor the original whitespace by capturing it above.
-                    # For example:
-                    #     `    border : 1px solid black ; // comment ` -->
-                    #     `    border : @prefix-lessvar3-border-lessv3sv1 @prefix-lessvar3-border-lessv3sv2 @prefix-lessvar3-border-lessv3sv3 ; // comment `
-                    # We run `strip()` on `shorthand_replacement` to remove the extra space that would be added above
-                    # to the first individual shorthand variable.
-                    # One thing to note here: `(' ' + important_text if important else '')` is Python's version of a ternary expression.
-                    # This is equivalent to: `(important ? ' ' + important_text : '')` in JavaScript:
-                    #     If the `!important` keyword is present (`important` is set to True), then add it to the style declaration.
-                    #     Otherwise, add nothing.
-                    replacement = space_before_property + css_property + space_after_property + ':' + space_before_value + shorthand_replacement.strip() + (' ' + important_text if important else '') + space_after_value + ';' + inline_comments
-                # If there are not spaces in the CSS value (meaning that it is not a shorthand and does not contain the `!important` keyword),
-                else:
-                    # add the variable to the global list of output variables
-                    variables.append(prefixed_name + ': ' + css_value + ';')
-
-                    # and reconstruct the style declaration replacing the CSS values with the newly-created variable.
-                    replacement = space_before_property + css_property + space_after_property + ':' + space_before_value + prefixed_name + space_after_value + ';' + inline_comments
-
-                # Now we have what we need to replace the original CSS values with the variables.
-                # Here, we replace the entire line (region) with the new replacement string by using `view.replace()`.
-                # `edit` is passed in to capture all command changes within one undo/redo function.
-                # `line` is the REGION representing the current line.
-                # `replacement` is the STRING that is to be the new line.
-                self.view.replace(edit, line, replacement)
-
-        # Now that all the values have been replaced with variables within the region,
-        # we can iterate over the global list of output variables to generate the the string to prepend at the top of the selection.
-        if variables:
-            # Here we join all the variables with a new line character `\n` between them
-            # and two new lines at the end to separate the variables from the original text.
-            # Note that in JavaScript, this would be:
-            #     `variables_output = (variables.reverse()).join('\n') + '\n\n';`
-            variables_output = "\n".join(reversed(variables)) + '\n\n'
+        # Here, we get the actual text of the full lines by passing the region into `view.substr()`.
+        # We do this only once for the whole region, since each call has to reach into Sublime Text itself.
+        # Then we hand the text over to `_process_block` to do the actual work.
+        result = _process_block(self.view.substr(full_lines), prefix)
+
+        # If any style declarations were found,
+        if result:
+            begin, end, new_text, variables_output = result
+
+            # we replace only the changed lines with the new text by using `view.replace()`.
+            # `begin` and `end` are counted from the start of the selected lines, so we add
+            # the position where the selected lines begin to get a `sublime.Region` within the whole buffer.
+            # `edit` is passed in to capture all command changes within one undo/redo function.
+            start = full_lines.begin()
+            self.view.replace(edit, sublime.Region(start + begin, start + end), new_text)
 
             # Finally, we insert this `variables_output` string of the list of variables to the top of the buffer (location 0).
             self.view.insert(edit, 0, variables_output)